@@ -1,28 +1,100 @@
 import os
-from fastapi import FastAPI, HTTPException, UploadFile, File, Form, Response
+import re
+import asyncio
+import hashlib
+import mimetypes
+import aiofiles
+import orjson
+from fastapi import FastAPI, HTTPException, UploadFile, File, Form, Response, Query, Request
+from fastapi.responses import JSONResponse, RedirectResponse
+from fastapi.staticfiles import StaticFiles
 from motor.motor_asyncio import AsyncIOMotorClient
-from pydantic import BaseModel
-from bson import ObjectId, Binary
+from pymongo import UpdateOne, ReturnDocument
+from pymongo.errors import PyMongoError
+from pydantic import BaseModel, ConfigDict
+from bson import ObjectId
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi import Query
-from typing import Optional, List, Literal
+from typing import Optional, List
+from enum import Enum
 import uvicorn
-from dotenv import load_dotenv
+from functools import lru_cache
+from types import MappingProxyType
+from contextlib import asynccontextmanager
+from pydantic_settings import BaseSettings, SettingsConfigDict
 
-app = FastAPI()
-
-load_dotenv()
+def orjson_default(obj):
+    # Anything Mongo hands back that orjson can't encode natively
+    if isinstance(obj, ObjectId): return str(obj)
+    raise TypeError
 
+class ORJSONResponse(JSONResponse):
+    """
+    JSON encoding in C; fastapi.responses.ORJSONResponse is deprecated upstream.
+    List routes return it directly, which also skips FastAPI's jsonable_encoder pass.
+    """
+    def render(self, content) -> bytes:
+        return orjson.dumps(content, default=orjson_default, option=orjson.OPT_NON_STR_KEYS)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await warm_up_pool()
+    await create_indexes()
+    yield
+    client.close()
+
+app = FastAPI(default_response_class=ORJSONResponse, lifespan=lifespan)
+
+# --- Settings ---
+# Read from the environment (or .env) once and validated at boot.
+# Relative paths resolve next to this file, not the process CWD.
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+class Settings(BaseSettings):
+    mongo_uri: str
+    # Transactions need a replica set (Atlas default); standalone servers reject them
+    mongo_transactions: bool = False
+    # Wire compression, in preference order; the server picks the first it supports (zstd needs MongoDB 4.2+)
+    mongo_compressors: str = "zstd,zlib"
+    photo_dir: str = "photos"
+    # Auto-reload is for local development only
+    uvicorn_reload: bool = False
+    # JSON list in the env, e.g. CORS_ORIGINS='["https://app.example.com"]'
+    cors_origins: List[str] = ["*"]
+    cors_allow_credentials: bool = False
+
+    model_config = SettingsConfigDict(env_file=os.path.join(BASE_DIR, ".env"))
+
+@lru_cache
+def get_settings() -> Settings:
+    return Settings()
+
+settings = get_settings()
+
+# Explicit lists keep Starlette's CORS checks to set lookups
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+    allow_origins=tuple(settings.cors_origins),
+    allow_credentials=settings.cors_allow_credentials,
+    allow_methods=("GET", "POST", "PUT", "DELETE"),
+    allow_headers=("Content-Type", "Authorization"),
 )
 
-MONGO_URI = os.getenv("MONGO_URI")
-client = AsyncIOMotorClient(MONGO_URI)
+# Explicit pool sizing: keep warm connections around and fail fast when Mongo is unreachable.
+# Compression shrinks large list payloads on the wire; a slower heartbeat means
+# less monitoring traffic competing with queries.
+client = AsyncIOMotorClient(
+    settings.mongo_uri,
+    maxPoolSize=50,
+    minPoolSize=10,
+    maxIdleTimeMS=30000,
+    serverSelectionTimeoutMS=3000,
+    connectTimeoutMS=3000,
+    heartbeatFrequencyMS=30000,
+    compressors=settings.mongo_compressors,
+    zlibCompressionLevel=3,
+    retryWrites=True,
+    uuidRepresentation="standard",
+)
 db = client.player_db
 
 collection = db.players
@@ -30,26 +102,154 @@ tournaments_collection = db.tournaments
 teams_collection = db.teams
 matches_collection = db.matches
 
+# Player reads never need the photo blob; player_helper only emits its URL.
+PLAYER_LIST_PROJECTION = {"photo_data": 0, "photo_content_type": 0}
+PHOTO_META_PROJECTION = {"photo_url": 1, "photo_content_type": 1}
+
+# Server-side equivalent of the Unbeaten % in player_helper
+UNBEATEN_PCT_EXPR = {
+    "$cond": [
+        {"$gt": ["$matches_played", 0]},
+        {"$round": [{"$multiply": [{"$divide": [
+            {"$add": [{"$ifNull": ["$wins", 0]}, {"$ifNull": ["$draws", 0]}]},
+            "$matches_played"
+        ]}, 100]}, 2]},
+        0.0
+    ]
+}
+
+# Shared tail of every player read pipeline
+PLAYER_READ_STAGES = [
+    {"$project": PLAYER_LIST_PROJECTION},
+    {"$addFields": {"unbeaten_percentage": UNBEATEN_PCT_EXPR}},
+]
+
+# --- Photo Storage ---
+# Photos live on disk and are served as static files; Mongo only keeps the URL.
+PHOTO_DIR = os.path.join(BASE_DIR, settings.photo_dir)
+PHOTO_URL_PREFIX = "/photos/"
+MAX_UPLOAD = 5 * 1024 * 1024
+UPLOAD_CHUNK = 1 << 20
+PHOTO_EXTENSIONS = {"image/jpeg": ".jpg", "image/png": ".png", "image/webp": ".webp", "image/avif": ".avif"}
+ALLOWED_MIME = frozenset(PHOTO_EXTENSIONS)
+# Legacy uploads predate the allow-list and may carry a non-standard JPEG type
+LEGACY_EXTENSIONS = {"image/jpg": ".jpg", "image/pjpeg": ".jpg"}
+os.makedirs(PHOTO_DIR, exist_ok=True)
+
+class CachedStaticFiles(StaticFiles):
+    # File names carry a content hash, so a URL never changes meaning.
+    def file_response(self, *args, **kwargs):
+        response = super().file_response(*args, **kwargs)
+        response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+        return response
+
+app.mount(PHOTO_URL_PREFIX.rstrip("/"), CachedStaticFiles(directory=PHOTO_DIR), name="photos")
+
+def photo_extension(content_type: Optional[str]) -> Optional[str]:
+    """
+    File extension for an image type, or None if there is none that
+    StaticFiles would map back to the same type.
+    """
+    ext = PHOTO_EXTENSIONS.get(content_type) or LEGACY_EXTENSIONS.get(content_type)
+    if ext: return ext
+    if not content_type or not content_type.startswith("image/"): return None
+    ext = mimetypes.guess_extension(content_type)
+    if ext and mimetypes.guess_type(f"x{ext}")[0] == content_type: return ext
+    return None
+
+def photo_filename(player_id, digest: str, content_type: str) -> str:
+    return f"{player_id}-{digest[:16]}{photo_extension(content_type)}"
+
+async def save_photo(player_id, photo: UploadFile) -> str:
+    """
+    Streams the upload to PHOTO_DIR and returns its public URL.
+    The file name is keyed by player ID plus a content hash, so the upload
+    goes to a temp file first and is renamed once the hash is known.
+    Raises 415 for non-image types and 413 once more than MAX_UPLOAD bytes have been read.
+    """
+    if photo.content_type not in ALLOWED_MIME:
+        raise HTTPException(415, "Unsupported image type")
+    if photo.size is not None and photo.size > MAX_UPLOAD:
+        raise HTTPException(413, "Photo too large")
+
+    hasher = hashlib.sha256()
+    size = 0
+    tmp_path = os.path.join(PHOTO_DIR, f".{player_id}-{ObjectId()}.part")
+    try:
+        async with aiofiles.open(tmp_path, "wb") as sink:
+            while chunk := await photo.read(UPLOAD_CHUNK):
+                size += len(chunk)
+                if size > MAX_UPLOAD: raise HTTPException(413, "Photo too large")
+                hasher.update(chunk)
+                await sink.write(chunk)
+        filename = photo_filename(player_id, hasher.hexdigest(), photo.content_type)
+        os.replace(tmp_path, os.path.join(PHOTO_DIR, filename))
+    finally:
+        if os.path.exists(tmp_path): os.remove(tmp_path)
+    return PHOTO_URL_PREFIX + filename
+
+async def migrate_legacy_photo(player_oid, data: bytes, content_type: str) -> Optional[str]:
+    """
+    Moves a photo blob still stored on the player document to PHOTO_DIR
+    and swaps it for a photo_url, so the document shrinks and later reads
+    are served as static files. Returns the new URL, or None if the blob
+    stays in Mongo because its type has no usable extension or a new photo
+    was uploaded meanwhile.
+    """
+    if photo_extension(content_type) is None: return None
+    filename = photo_filename(player_oid, hashlib.sha256(data).hexdigest(), content_type)
+    url = PHOTO_URL_PREFIX + filename
+    # Write under a temp name so the static route never sees a partial file
+    tmp_path = os.path.join(PHOTO_DIR, f".{filename}-{ObjectId()}.part")
+    try:
+        async with aiofiles.open(tmp_path, "wb") as f:
+            await f.write(data)
+        os.replace(tmp_path, os.path.join(PHOTO_DIR, filename))
+    finally:
+        if os.path.exists(tmp_path): os.remove(tmp_path)
+
+    # Leave the doc alone if a new photo was uploaded meanwhile
+    result = await collection.update_one(
+        {"_id": player_oid, "photo_url": {"$exists": False}},
+        {"$set": {"photo_url": url}, "$unset": {"photo_data": ""}}
+    )
+    if result.matched_count: return url
+    # Keep the file only if a concurrent migration of the same blob claimed it
+    current = await collection.find_one({"_id": player_oid}, {"photo_url": 1})
+    if not current or current.get("photo_url") != url: remove_photo(url)
+    return None
+
+def remove_photo(photo_url: Optional[str]):
+    if not photo_url or not photo_url.startswith(PHOTO_URL_PREFIX): return
+    path = os.path.join(PHOTO_DIR, os.path.basename(photo_url))
+    if os.path.exists(path): os.remove(path)
+
 # --- Helper: Player Serializer ---
 def player_helper(player) -> dict:
+    pid = str(player["_id"])
     matches = player.get("matches_played", 0)
     wins = player.get("wins", 0)
     draws = player.get("draws", 0)
     loss = player.get("loss", 0)
 
-    if matches > 0:
-        non_losing_games = wins + draws
-        unbeaten_pct = round((non_losing_games / matches) * 100, 2)
-    else:
-        unbeaten_pct = 0.0
+    # Reads come through PLAYER_READ_STAGES and already carry it;
+    # write responses are built in memory and compute it here
+    unbeaten_pct = player.get("unbeaten_percentage")
+    if unbeaten_pct is None:
+        if matches > 0:
+            non_losing_games = wins + draws
+            unbeaten_pct = round((non_losing_games / matches) * 100, 2)
+        else:
+            unbeaten_pct = 0.0
 
     return {
-        "id": str(player["_id"]),
+        "id": pid,
         "name": player["name"],
         "dob": player["dob"],
         "instagram_link": player.get("instagram_link"),
         "facebook_link": player.get("facebook_link"),
-        "photo_url": f"/players/{str(player['_id'])}/photo",
+        # Legacy documents still hold the blob and are served by the photo route
+        "photo_url": player.get("photo_url") or f"/players/{pid}/photo",
         "matches_played": matches,
         "wins": wins,
         "draws": draws,
@@ -57,81 +257,196 @@ def player_helper(player) -> dict:
         "unbeaten_percentage": unbeaten_pct
     }
 
+# --- Helper: ObjectId Parsing ---
+_OID_RE = re.compile(r"[0-9a-fA-F]{24}")
+
+def parse_oid(id: str) -> ObjectId:
+    """Validates and parses a hex ID once; raises 400 on malformed input."""
+    # The regex rejects bad input before ObjectId's own parsing and exception path
+    if not isinstance(id, str) or not _OID_RE.fullmatch(id):
+        raise HTTPException(400, "Invalid ID")
+    return ObjectId(id)
+
+# --- Helper: List Shaping ---
+# Upper bound for unpaginated list endpoints
+MAX_LIST_LENGTH = 1000
+
+# Expose _id as a string "id", done server-side in aggregation reads
+ID_STAGES = [{"$addFields": {"id": {"$toString": "$_id"}}}, {"$project": {"_id": 0}}]
+
 # --- Pydantic Models ---
-class PlayerUpdate(BaseModel):
+# Request bodies are validated once and never mutated; unknown fields are rejected
+class RequestModel(BaseModel):
+    model_config = ConfigDict(extra="forbid", frozen=True)
+
+class PlayerUpdate(RequestModel):
     name: Optional[str] = None
     dob: Optional[str] = None
     instagram_link: Optional[str] = None
     facebook_link: Optional[str] = None
 
-class TournamentCreate(BaseModel):
+class TournamentCreate(RequestModel):
     name: str
     total_teams: int
 
-class TeamCreate(BaseModel):
+class TeamCreate(RequestModel):
     name: str
     tournament_id: str
     player_ids: List[str]
 
-class TeamUpdate(BaseModel):
+class TeamUpdate(RequestModel):
     name: str
 
-class PlayerMatchResult(BaseModel):
+class MatchResult(str, Enum):
+    WIN = "win"
+    LOSS = "loss"
+    DRAW = "draw"
+    SUB = "sub"
+
+class PlayerMatchResult(RequestModel):
+    # Keep plain strings after validation: they key the $inc tables and are stored as-is
+    model_config = ConfigDict(use_enum_values=True)
+
     player_id: str
-    result: Literal['win', 'loss', 'draw', 'sub']
+    result: MatchResult
 
-class MatchCreate(BaseModel):
+class MatchCreate(RequestModel):
     tournament_id: str
     team_id: str
     opponent_name: str
     player_results: List[PlayerMatchResult]
 
+# --- Stat Increments ---
+# $inc documents per result, built once instead of per player per request.
+# "sub" has no entry: substitutes don't get a match counted.
+# Read-only, since every request shares them; stat_delta_ops copies them
+# into fresh per-request dicts (reversals just flip the sign there).
+def frozen_table(table: dict) -> MappingProxyType:
+    return MappingProxyType({res: MappingProxyType(inc) for res, inc in table.items()})
+
+TEAM_INC = frozen_table({
+    "win": {"stats.matches_played": 1, "stats.wins": 1, "stats.points": 3},
+    "loss": {"stats.matches_played": 1, "stats.loss": 1, "stats.points": 0},
+    "draw": {"stats.matches_played": 1, "stats.draws": 1, "stats.points": 1},
+})
+GLOBAL_INC = frozen_table({
+    "win": {"matches_played": 1, "wins": 1},
+    "loss": {"matches_played": 1, "loss": 1},
+    "draw": {"matches_played": 1, "draws": 1},
+})
+TOURNEY_INC = frozen_table({res: {f"players.$.stats.{k}": v for k, v in inc.items()} for res, inc in GLOBAL_INC.items()})
+
+# --- Helper: Team Outcome ---
+# Keyed by sign(player wins - player losses)
+RESULT_BY_SIGN = {1: "win", -1: "loss", 0: "draw"}
+
+def build_match_doc(match: MatchCreate) -> dict:
+    """Match record to store, with the team outcome derived from player results."""
+    wins = sum(1 for p in match.player_results if p.result == "win")
+    losses = sum(1 for p in match.player_results if p.result == "loss")
+    match_doc = match.model_dump()
+    match_doc["calculated_team_result"] = RESULT_BY_SIGN[(wins > losses) - (wins < losses)]
+    return match_doc
+
+# --- Helper: Stat Bulk Ops ---
+def stat_delta_ops(changes):
+    """
+    Builds net $inc bulk ops as (player_ops, team_ops).
+    changes is a list of (team_oid, team_result, results, sign) where results
+    is an iterable of (player_id, result) pairs and sign=-1 reverses a match.
+    Increments are summed per document first, so anything that cancels out
+    (e.g. an edited match whose result didn't change) produces no op.
+    """
+    player_incs = {}  # player oid -> {field: delta}
+    team_incs = {}    # (team oid, player_id or None for the team itself) -> {field: delta}
+    player_oids = {}  # player_id -> oid, so each ID is parsed once across all changes
+
+    def add(incs, key, doc, sign):
+        acc = incs.setdefault(key, {})
+        for k, v in doc.items(): acc[k] = acc.get(k, 0) + sign * v
+
+    for team_oid, team_result, results, sign in changes:
+        add(team_incs, (team_oid, None), TEAM_INC[team_result], sign)
+        for pid, res in results:
+            if res not in GLOBAL_INC: continue  # sub
+            oid = player_oids.get(pid)
+            if oid is None: oid = player_oids[pid] = parse_oid(pid)
+            add(player_incs, oid, GLOBAL_INC[res], sign)
+            add(team_incs, (team_oid, pid), TOURNEY_INC[res], sign)
+
+    def nonzero(acc): return {k: v for k, v in acc.items() if v}
+
+    player_ops = [UpdateOne({"_id": oid}, {"$inc": inc}) for oid, acc in player_incs.items() if (inc := nonzero(acc))]
+    team_ops = []
+    for (team_oid, pid), acc in team_incs.items():
+        inc = nonzero(acc)
+        if not inc: continue
+        query = {"_id": team_oid} if pid is None else {"_id": team_oid, "players.player_id": pid}
+        team_ops.append(UpdateOne(query, {"$inc": inc}))
+    return player_ops, team_ops
+
+def stat_ops(team_oid, team_result, results):
+    """$inc bulk ops for applying one match."""
+    return stat_delta_ops([(team_oid, team_result, results, 1)])
+
+def match_results(match_doc):
+    """(player_id, result) pairs of a stored match document."""
+    return [(p["player_id"], p["result"]) for p in match_doc.get("player_results", [])]
+
+def stat_writes(player_ops, team_ops):
+    """Wraps stat ops as run_writes callables: one bulk_write per collection."""
+    # bulk_write rejects an empty list (e.g. every player was a sub)
+    writes = []
+    if team_ops:
+        writes.append(lambda s: teams_collection.bulk_write(team_ops, ordered=False, session=s))
+    if player_ops:
+        writes.append(lambda s: collection.bulk_write(player_ops, ordered=False, session=s))
+    return writes
+
 # --- Helper: Rollback Stats Logic ---
-async def rollback_match_stats(match_doc):
+# Fields a stored match needs for its stats to be reversed
+ROLLBACK_PROJECTION = {"team_id": 1, "calculated_team_result": 1, "player_results": 1}
+
+def reversal(match_doc):
     """
-    Reverses the stats effects of a match.
-    Subtracts points/wins/losses from Team and Players.
+    stat_delta_ops change that reverses the stats effects of a stored match:
+    subtracts points/wins/losses from Team and Players.
     """
-    team_id = match_doc["team_id"]
     team_result = match_doc.get("calculated_team_result", "draw")
-    player_results = match_doc.get("player_results", [])
-    
-    # 1. Reverse Team Stats
-    team_inc = {"stats.matches_played": -1}
-    if team_result == "win":
-        team_inc["stats.wins"] = -1
-        team_inc["stats.points"] = -3
-    elif team_result == "loss":
-        team_inc["stats.loss"] = -1
-    else: # draw
-        team_inc["stats.draws"] = -1
-        team_inc["stats.points"] = -1
-        
-    await teams_collection.update_one({"_id": ObjectId(team_id)}, {"$inc": team_inc})
-
-    # 2. Reverse Player Stats
-    for p in player_results:
-        pid = p["player_id"]
-        res = p["result"]
-        if res == "sub": continue
-        
-        # Global
-        g_inc = {"matches_played": -1}
-        if res == "win": g_inc["wins"] = -1
-        elif res == "loss": g_inc["loss"] = -1
-        elif res == "draw": g_inc["draws"] = -1
-        await collection.update_one({"_id": ObjectId(pid)}, {"$inc": g_inc})
-
-        # Tournament
-        t_inc = {"players.$.stats.matches_played": -1}
-        if res == "win": t_inc["players.$.stats.wins"] = -1
-        elif res == "loss": t_inc["players.$.stats.loss"] = -1
-        elif res == "draw": t_inc["players.$.stats.draws"] = -1
-        
-        await teams_collection.update_one(
-            {"_id": ObjectId(team_id), "players.player_id": pid},
-            {"$inc": t_inc}
-        )
+    return (ObjectId(match_doc["team_id"]), team_result, match_results(match_doc), -1)
+
+# --- Startup: Connection Pool + Indexes (run from lifespan) ---
+async def warm_up_pool():
+    # Pay the connection handshake here rather than on the first user request
+    await client.admin.command("ping")
+
+async def create_indexes():
+    # create_index is a no-op when the index already exists, so build them concurrently
+    await asyncio.gather(
+        teams_collection.create_index("tournament_id"),
+        teams_collection.create_index("players.player_id"),
+        matches_collection.create_index([("tournament_id", 1)]),
+    )
+
+# --- Helper: Multi-Collection Writes ---
+async def run_writes(writes):
+    """
+    Runs write callables that each take a session (or None).
+    With settings.mongo_transactions enabled they commit atomically in one transaction,
+    one after another since a session can't be used concurrently; the driver
+    retries the whole transaction on transient errors. Otherwise they are
+    independent and sent concurrently.
+    """
+    if not settings.mongo_transactions:
+        await asyncio.gather(*(write(None) for write in writes))
+        return
+
+    async def apply(s):
+        for write in writes:
+            await write(s)
+
+    async with await client.start_session() as s:
+        await s.with_transaction(apply)
 
 # --- ROUTES ---
 
@@ -139,14 +454,17 @@ async def rollback_match_stats(match_doc):
 async def root():
     return {"message": "API Running"}
 
-# ... (Include your existing PLAYER routes here: add_player, get_all_players, etc.) ...
-# [Paste previous Player Routes here if needed, omitting for brevity as they haven't changed]
+# ===========================
+#      PLAYER MANAGEMENT
+# ===========================
+
 @app.post("/players/")
 async def add_player(name: str = Form(...), dob: str = Form(...), instagram_link: str = Form(...), facebook_link: str = Form(...), photo: UploadFile = File(...)):
-    photo_content = await photo.read()
-    player_data = {"name": name, "dob": dob, "instagram_link": instagram_link, "facebook_link": facebook_link, "photo_data": Binary(photo_content), "photo_content_type": photo.content_type, "matches_played": 0, "wins": 0, "draws": 0, "loss": 0}
-    new_player = await collection.insert_one(player_data)
-    return player_helper(await collection.find_one({"_id": new_player.inserted_id}))
+    player_id = ObjectId()
+    photo_url = await save_photo(player_id, photo)
+    player_data = {"_id": player_id, "name": name, "dob": dob, "instagram_link": instagram_link, "facebook_link": facebook_link, "photo_url": photo_url, "photo_content_type": photo.content_type, "matches_played": 0, "wins": 0, "draws": 0, "loss": 0}
+    await collection.insert_one(player_data)
+    return player_helper(player_data)
 
 @app.get("/players/")
 async def get_players(
@@ -167,56 +485,97 @@ async def get_players(
     total_count = await collection.count_documents(query)
     total_pages = (total_count + limit - 1) // limit
 
-    # 4. Fetch Paginated Data
-    players = []
-    cursor = collection.find(query).skip(skip).limit(limit)
-    async for player in cursor:
-        players.append(player_helper(player))
+    # 4. Fetch Paginated Data (Unbeaten % is computed server-side)
+    pipeline = [
+        {"$match": query},
+        {"$skip": skip},
+        {"$limit": limit},
+        *PLAYER_READ_STAGES,
+    ]
+    docs = await collection.aggregate(pipeline).to_list(length=limit)
+    players = [player_helper(d) for d in docs]
 
     # 5. Return Structured Response
-    return {
+    return ORJSONResponse({
         "players": players,
         "total_players": total_count,
         "total_pages": total_pages,
         "current_page": page,
         "limit": limit
-    }
+    })
 
 @app.get("/players/{id}")
 async def get_player(id: str):
-    if not ObjectId.is_valid(id): raise HTTPException(400, "Invalid ID")
-    p = await collection.find_one({"_id": ObjectId(id)})
-    if p: return player_helper(p)
+    oid = parse_oid(id)
+    docs = await collection.aggregate([{"$match": {"_id": oid}}, *PLAYER_READ_STAGES]).to_list(length=1)
+    if docs: return player_helper(docs[0])
     raise HTTPException(404, "Not Found")
 
 @app.get("/players/{id}/photo")
-async def get_player_photo(id: str):
-    if not ObjectId.is_valid(id): raise HTTPException(400, "Invalid ID")
-    p = await collection.find_one({"_id": ObjectId(id)})
-    if p and "photo_data" in p: return Response(content=p["photo_data"], media_type=p["photo_content_type"])
-    raise HTTPException(404, "Photo not found")
+async def get_player_photo(id: str, request: Request):
+    oid = parse_oid(id)
+    # Match only players that have a photo, without fetching the blob itself
+    has_photo = {"$or": [{"photo_url": {"$nin": [None, ""]}}, {"photo_data": {"$exists": True}}]}
+    p = await collection.find_one({"_id": oid, **has_photo}, PHOTO_META_PROJECTION)
+    if not p: raise HTTPException(404, "Photo not found")
+    if p.get("photo_url"): return RedirectResponse(url=p["photo_url"], status_code=307)
+
+    # Legacy blob in Mongo
+    content_type = p.get("photo_content_type")
+    headers = {"Cache-Control": "public, max-age=86400"}
+    if photo_extension(content_type) is None:
+        # It can't move to disk, so answer revalidations without fetching the blob.
+        # A new upload replaces the blob with a photo_url, so the ID alone is a stable tag.
+        etag = f'"{oid}"'
+        headers["ETag"] = etag
+        if_none_match = request.headers.get("if-none-match", "")
+        if etag in (tag.strip() for tag in if_none_match.split(",")):
+            return Response(status_code=304, headers=headers)
+
+    blob = await collection.find_one({"_id": oid}, {"photo_data": 1})
+    if not blob or "photo_data" not in blob: raise HTTPException(404, "Photo not found")
+    # Serve this copy directly; once migrated, the next request is redirected to the static file.
+    # Migration is best-effort: on failure the blob stays put and the next read retries.
+    try:
+        await migrate_legacy_photo(oid, blob["photo_data"], content_type)
+    except (OSError, PyMongoError):
+        pass
+    return Response(content=blob["photo_data"], media_type=content_type, headers=headers)
 
 @app.put("/players/{id}")
 async def update_player(id: str, name: Optional[str] = Form(None), dob: Optional[str] = Form(None), instagram_link: Optional[str] = Form(None), facebook_link: Optional[str] = Form(None), photo: Optional[UploadFile] = File(None)):
-    if not ObjectId.is_valid(id): raise HTTPException(400, "Invalid ID")
+    oid = parse_oid(id)
     update_data = {}
     if name: update_data["name"] = name
     if dob: update_data["dob"] = dob
     if instagram_link: update_data["instagram_link"] = instagram_link
     if facebook_link: update_data["facebook_link"] = facebook_link
     if photo:
-        content = await photo.read()
-        update_data["photo_data"] = Binary(content)
+        update_data["photo_url"] = await save_photo(oid, photo)
         update_data["photo_content_type"] = photo.content_type
     if not update_data: raise HTTPException(400, "No data")
-    await collection.update_one({"_id": ObjectId(id)}, {"$set": update_data})
-    return player_helper(await collection.find_one({"_id": ObjectId(id)}))
+    update = {"$set": update_data}
+    if photo: update["$unset"] = {"photo_data": ""}
+
+    # Single round trip: the pre-update doc gives us the old photo URL,
+    # and merging update_data into it yields the response.
+    old = await collection.find_one_and_update(
+        {"_id": oid}, update,
+        projection=PLAYER_LIST_PROJECTION, return_document=ReturnDocument.BEFORE
+    )
+    if not old:
+        if photo: remove_photo(update_data["photo_url"])
+        raise HTTPException(404, "Not Found")
+    if photo and old.get("photo_url") != update_data["photo_url"]: remove_photo(old.get("photo_url"))
+    return player_helper({**old, **update_data})
 
 @app.delete("/players/{id}")
 async def delete_player(id: str):
-    if not ObjectId.is_valid(id): raise HTTPException(400, "Invalid ID")
-    res = await collection.delete_one({"_id": ObjectId(id)})
-    if res.deleted_count == 1: return {"message": "Deleted"}
+    oid = parse_oid(id)
+    p = await collection.find_one_and_delete({"_id": oid}, projection={"photo_url": 1})
+    if p:
+        remove_photo(p.get("photo_url"))
+        return {"message": "Deleted"}
     raise HTTPException(404, "Not Found")
 
 
@@ -226,18 +585,13 @@ async def delete_player(id: str):
 
 @app.post("/tournaments/")
 async def create_tournament(tournament: TournamentCreate):
-    t_data = tournament.dict()
+    t_data = tournament.model_dump()
     new_t = await tournaments_collection.insert_one(t_data)
     return {"message": "Tournament created", "id": str(new_t.inserted_id)}
 
 @app.get("/tournaments/")
 async def get_tournaments():
-    tournaments = []
-    async for t in tournaments_collection.find():
-        t["id"] = str(t["_id"])
-        del t["_id"]
-        tournaments.append(t)
-    return tournaments
+    return ORJSONResponse(await tournaments_collection.aggregate(ID_STAGES).to_list(length=MAX_LIST_LENGTH))
 
 
 # ===========================
@@ -246,16 +600,23 @@ async def get_tournaments():
 
 @app.post("/teams/")
 async def add_team(team: TeamCreate):
-    if not await tournaments_collection.find_one({"_id": ObjectId(team.tournament_id)}):
+    # Tournament check and roster lookup are independent: one $in query, run concurrently
+    # Duplicate IDs would add the same player twice (positional updates only hit the first)
+    player_oids = list(dict.fromkeys(parse_oid(pid) for pid in team.player_ids))
+    tournament, players = await asyncio.gather(
+        tournaments_collection.find_one({"_id": parse_oid(team.tournament_id)}, {"_id": 1}),
+        collection.find({"_id": {"$in": player_oids}}, {"name": 1}).to_list(length=None),
+    )
+    if not tournament:
         raise HTTPException(status_code=404, detail="Tournament not found")
-    
+
+    names = {p["_id"]: p["name"] for p in players}
     team_players = []
-    for pid in team.player_ids:
-        p = await collection.find_one({"_id": ObjectId(pid)})
-        if not p: raise HTTPException(status_code=400, detail=f"Invalid Player ID: {pid}")
+    for oid in player_oids:
+        if oid not in names: raise HTTPException(status_code=400, detail=f"Invalid Player ID: {oid}")
         team_players.append({
-            "player_id": str(p["_id"]),
-            "name": p["name"],
+            "player_id": str(oid),
+            "name": names[oid],
             "stats": {"matches_played": 0, "wins": 0, "draws": 0, "loss": 0}
         })
 
@@ -270,52 +631,66 @@ async def add_team(team: TeamCreate):
 
 @app.get("/tournaments/{tournament_id}/teams")
 async def get_tournament_teams(tournament_id: str):
-    teams = []
-    async for team in teams_collection.find({"tournament_id": tournament_id}):
-        team["id"] = str(team["_id"])
-        del team["_id"]
-        teams.append(team)
-    return teams
+    pipeline = [{"$match": {"tournament_id": tournament_id}}, *ID_STAGES]
+    return ORJSONResponse(await teams_collection.aggregate(pipeline).to_list(length=MAX_LIST_LENGTH))
+
+@app.get("/tournaments/{tournament_id}/overview")
+async def get_tournament_overview(tournament_id: str):
+    # Teams and the points leaderboard share one $match scan via $facet
+    pipeline = [
+        {"$match": {"tournament_id": tournament_id}},
+        {"$facet": {
+            "teams": [{"$limit": MAX_LIST_LENGTH}, *ID_STAGES],
+            "leaderboard": [
+                {"$sort": {"stats.points": -1, "name": 1}},
+                {"$limit": 10},
+                {"$project": {"_id": 0, "id": {"$toString": "$_id"}, "name": 1, "stats.points": 1}},
+            ],
+        }},
+    ]
+    docs = await teams_collection.aggregate(pipeline).to_list(length=1)
+    return ORJSONResponse(docs[0] if docs else {"teams": [], "leaderboard": []})
 
 @app.delete("/tournaments/{id}")
 async def delete_tournament(id: str):
-    if not ObjectId.is_valid(id):
-        raise HTTPException(status_code=400, detail="Invalid ID")
+    oid = parse_oid(id)
 
     # 1. Check if tournament exists
-    tournament = await tournaments_collection.find_one({"_id": ObjectId(id)})
+    tournament = await tournaments_collection.find_one({"_id": oid})
     if not tournament:
         raise HTTPException(status_code=404, detail="Tournament not found")
 
     # 2. Fetch all matches in this tournament to rollback stats
-    # We must undo the stats for every match played in this tournament
-    async for match in matches_collection.find({"tournament_id": id}):
-        await rollback_match_stats(match)
-
-    # 3. Delete all Matches associated with this tournament
-    await matches_collection.delete_many({"tournament_id": id})
-
-    # 4. Delete all Teams associated with this tournament
-    await teams_collection.delete_many({"tournament_id": id})
-
-    # 5. Finally, delete the Tournament itself
-    await tournaments_collection.delete_one({"_id": ObjectId(id)})
+    # We must undo the stats for every match played in this tournament;
+    # they're summed into one net update per player. Team stats are skipped
+    # since the teams themselves are deleted below.
+    matches = await matches_collection.find({"tournament_id": id}, ROLLBACK_PROJECTION).to_list(length=None)
+    player_ops, _ = stat_delta_ops([reversal(m) for m in matches])
+
+    # 3-5. Delete all Matches and Teams associated with this tournament,
+    # and the Tournament itself, alongside the rollback
+    await run_writes([
+        *stat_writes(player_ops, []),
+        lambda s: matches_collection.delete_many({"tournament_id": id}, session=s),
+        lambda s: teams_collection.delete_many({"tournament_id": id}, session=s),
+        lambda s: tournaments_collection.delete_one({"_id": oid}, session=s),
+    ])
 
     return {"message": "Tournament and all associated data deleted successfully"}
 
 @app.delete("/teams/{id}")
 async def delete_team(id: str):
-    if not ObjectId.is_valid(id): raise HTTPException(400, "Invalid ID")
+    oid = parse_oid(id)
     
-    res = await teams_collection.delete_one({"_id": ObjectId(id)})
+    res = await teams_collection.delete_one({"_id": oid})
     if res.deleted_count == 1: return {"message": "Team deleted"}
     raise HTTPException(404, "Team not found")
 
 @app.put("/teams/{id}")
 async def update_team(id: str, team: TeamUpdate):
-    if not ObjectId.is_valid(id): raise HTTPException(400, "Invalid ID")
+    oid = parse_oid(id)
     res = await teams_collection.update_one(
-        {"_id": ObjectId(id)}, 
+        {"_id": oid}, 
         {"$set": {"name": team.name}}
     )
     if res.modified_count == 1: return {"message": "Team updated"}
@@ -328,155 +703,83 @@ async def update_team(id: str, team: TeamUpdate):
 
 @app.get("/tournaments/{tournament_id}/matches")
 async def get_tournament_matches(tournament_id: str):
-    matches = []
-    async for m in matches_collection.find({"tournament_id": tournament_id}):
-        m["id"] = str(m["_id"])
-        del m["_id"]
-        # Fetch team name for display
-        team = await teams_collection.find_one({"_id": ObjectId(m["team_id"])})
-        m["team_name"] = team["name"] if team else "Unknown Team"
-        matches.append(m)
-    return matches
+    pipeline = [
+        {"$match": {"tournament_id": tournament_id}},
+        # Join the team name for display; team_id is stored as a string
+        {"$lookup": {
+            "from": teams_collection.name,
+            "let": {"tid": {"$toObjectId": "$team_id"}},
+            "pipeline": [{"$match": {"$expr": {"$eq": ["$_id", "$$tid"]}}}, {"$project": {"name": 1}}],
+            "as": "team",
+        }},
+        *ID_STAGES,
+        {"$addFields": {"team_name": {"$ifNull": [{"$arrayElemAt": ["$team.name", 0]}, "Unknown Team"]}}},
+        {"$project": {"team": 0}},
+    ]
+    return ORJSONResponse(await matches_collection.aggregate(pipeline).to_list(length=MAX_LIST_LENGTH))
 
 @app.post("/matches/")
 async def record_match(match: MatchCreate):
-    # A. Calculate Team Outcome
-    match_wins = 0
-    match_losses = 0
-    for p in match.player_results:
-        if p.result == 'win': match_wins += 1
-        elif p.result == 'loss': match_losses += 1
-            
-    team_result = "draw"
-    points_awarded = 1
-    if match_wins > match_losses:
-        team_result = "win"
-        points_awarded = 3
-    elif match_losses > match_wins:
-        team_result = "loss"
-        points_awarded = 0
-
-    # B. Save Match Record
-    match_doc = match.dict()
-    match_doc["calculated_team_result"] = team_result
-    new_match = await matches_collection.insert_one(match_doc)
-
-    # C. Update TEAM Stats
-    team_update_fields = {"stats.matches_played": 1, "stats.points": points_awarded}
-    if team_result == "win": team_update_fields["stats.wins"] = 1
-    elif team_result == "loss": team_update_fields["stats.loss"] = 1
-    else: team_update_fields["stats.draws"] = 1
-
-    await teams_collection.update_one({"_id": ObjectId(match.team_id)}, {"$inc": team_update_fields})
-
-    # D. Update PLAYER Stats
-    for p_res in match.player_results:
-        pid = p_res.player_id
-        res = p_res.result
-        if res == "sub": continue
-
-        # Global
-        global_inc = {"matches_played": 1}
-        if res == "win": global_inc["wins"] = 1
-        elif res == "loss": global_inc["loss"] = 1
-        elif res == "draw": global_inc["draws"] = 1
-        await collection.update_one({"_id": ObjectId(pid)}, {"$inc": global_inc})
-
-        # Tournament
-        tourney_inc = {"players.$.stats.matches_played": 1}
-        if res == "win": tourney_inc["players.$.stats.wins"] = 1
-        elif res == "loss": tourney_inc["players.$.stats.loss"] = 1
-        elif res == "draw": tourney_inc["players.$.stats.draws"] = 1
-        await teams_collection.update_one(
-            {"_id": ObjectId(match.team_id), "players.player_id": pid},
-            {"$inc": tourney_inc}
-        )
+    team_oid = parse_oid(match.team_id)
+
+    # A + B. Calculate Team Outcome; the record is written together with the stats below
+    match_doc = build_match_doc(match)
+    team_result = match_doc["calculated_team_result"]
+
+    # C + D. Update TEAM and PLAYER Stats (batched: one round trip per collection)
+    results = [(p.player_id, p.result) for p in match.player_results]
+    player_ops, team_ops = stat_ops(team_oid, team_result, results)
+
+    await run_writes([
+        lambda s: matches_collection.insert_one(match_doc, session=s),
+        *stat_writes(player_ops, team_ops),
+    ])
 
     return {"message": "Match recorded", "team_result": team_result}
 
 @app.delete("/matches/{id}")
 async def delete_match(id: str):
-    if not ObjectId.is_valid(id): raise HTTPException(400, "Invalid ID")
+    oid = parse_oid(id)
     
     # 1. Fetch match to know what to rollback
-    match = await matches_collection.find_one({"_id": ObjectId(id)})
+    match = await matches_collection.find_one({"_id": oid}, ROLLBACK_PROJECTION)
     if not match: raise HTTPException(404, "Match not found")
     
-    # 2. Rollback Stats
-    await rollback_match_stats(match)
-    
-    # 3. Delete Document
-    await matches_collection.delete_one({"_id": ObjectId(id)})
+    # 2 + 3. Rollback Stats and Delete Document
+    await run_writes([
+        *stat_writes(*stat_delta_ops([reversal(match)])),
+        lambda s: matches_collection.delete_one({"_id": oid}, session=s),
+    ])
     
     return {"message": "Match deleted and stats rolled back"}
 
 @app.put("/matches/{id}")
 async def update_match(id: str, match: MatchCreate):
-    if not ObjectId.is_valid(id): raise HTTPException(400, "Invalid ID")
+    oid = parse_oid(id)
     
+    team_oid = parse_oid(match.team_id)
+
     # 1. Fetch old match
-    old_match = await matches_collection.find_one({"_id": ObjectId(id)})
+    old_match = await matches_collection.find_one({"_id": oid})
     if not old_match: raise HTTPException(404, "Match not found")
     
-    # 2. Rollback old stats
-    await rollback_match_stats(old_match)
-    
-    # 3. Delete old match record (effectively, we replace it)
-    await matches_collection.delete_one({"_id": ObjectId(id)})
-    
-     
-    
-    match_wins = 0
-    match_losses = 0
-    for p in match.player_results:
-        if p.result == 'win': match_wins += 1
-        elif p.result == 'loss': match_losses += 1
-    
-    team_result = "draw"
-    points_awarded = 1
-    if match_wins > match_losses:
-        team_result = "win"
-        points_awarded = 3
-    elif match_losses > match_wins:
-        team_result = "loss"
-        points_awarded = 0
-
-    match_doc = match.dict()
-    match_doc["calculated_team_result"] = team_result
-    # Use the OLD ID to keep the same URL/ID
-    match_doc["_id"] = ObjectId(id) 
-    await matches_collection.insert_one(match_doc)
-
-    # Update Team Stats (New)
-    team_update_fields = {"stats.matches_played": 1, "stats.points": points_awarded}
-    if team_result == "win": team_update_fields["stats.wins"] = 1
-    elif team_result == "loss": team_update_fields["stats.loss"] = 1
-    else: team_update_fields["stats.draws"] = 1
-
-    await teams_collection.update_one({"_id": ObjectId(match.team_id)}, {"$inc": team_update_fields})
-
-    # Update Player Stats (New)
-    for p_res in match.player_results:
-        pid = p_res.player_id
-        res = p_res.result
-        if res == "sub": continue
-
-        global_inc = {"matches_played": 1}
-        if res == "win": global_inc["wins"] = 1
-        elif res == "loss": global_inc["loss"] = 1
-        elif res == "draw": global_inc["draws"] = 1
-        await collection.update_one({"_id": ObjectId(pid)}, {"$inc": global_inc})
-
-        tourney_inc = {"players.$.stats.matches_played": 1}
-        if res == "win": tourney_inc["players.$.stats.wins"] = 1
-        elif res == "loss": tourney_inc["players.$.stats.loss"] = 1
-        elif res == "draw": tourney_inc["players.$.stats.draws"] = 1
-        await teams_collection.update_one(
-            {"_id": ObjectId(match.team_id), "players.player_id": pid},
-            {"$inc": tourney_inc}
-        )
+    # 2. Replace the record in place (same ID/URL)
+    match_doc = build_match_doc(match)
+    team_result = match_doc["calculated_team_result"]
+
+    # 3. Apply only the net stat change between the old and new versions
+    results = [(p.player_id, p.result) for p in match.player_results]
+    player_ops, team_ops = stat_delta_ops([
+        reversal(old_match),
+        (team_oid, team_result, results, 1),
+    ])
+
+    await run_writes([
+        lambda s: matches_collection.replace_one({"_id": oid}, match_doc, session=s),
+        *stat_writes(player_ops, team_ops),
+    ])
 
     return {"message": "Match updated successfully"}
 
 if __name__ == "__main__":
-    uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
+    uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=settings.uvicorn_reload)
\ No newline at end of file